@@ -11,14 +11,193 @@
 # - https://docs.ansible.com/ansible/latest/collections_guide/collections_installing.html
 # - https://docs.ansible.com/ansible/latest/reference_appendices/common_return_values.html#diff
 
-from urllib.parse import urljoin
-from typing import List
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urljoin, urlparse
+from urllib3.exceptions import NewConnectionError
+from typing import Dict, Iterable, List, Optional, Tuple
+import fcntl
 import json
-import re
+import os
+import random
+import socket
+import string
+import tempfile
+import time
 import requests
+import requests.adapters
 from ansible.module_utils.basic import AnsibleModule
 
 
+# the same checks as the InputChecker of the API
+VALID_CHARACTERS = frozenset(string.ascii_uppercase)
+VALID_NUMBERS = range(1, 256)
+
+
+class ValidationError(ValueError):
+    """
+    Input that the API will not accept, raised before any call is made
+
+    :param violations: all the violations that are found
+    """
+
+    def __init__(self, violations: List[str]):
+        super().__init__('; '.join(violations))
+        self.violations = violations
+
+
+def validate_batch(characters: Iterable[str] = (), numbers: Iterable[int] = ()) -> List[str]:
+    """
+    Check a whole batch of characters and numbers in one pass, without calling the API
+
+    :param characters: characters (keys) to check
+    :param numbers: numbers (values) to check
+    :returns: all the violations, empty if the batch is valid
+    """
+    violations = [f'character: "{character}" must be an alpha letter and in upper case'
+                  for character in characters
+                  if not isinstance(character, str) or character not in VALID_CHARACTERS]
+    violations.extend(f'number: {number} must be between 1 and 255'
+                      for number in numbers
+                      if type(number) is not int or number not in VALID_NUMBERS)  # pylint: disable=unidiomatic-typecheck
+    return violations
+
+
+def check_batch(characters: Iterable[str] = (), numbers: Iterable[int] = ()) -> None:
+    """
+    Check a whole batch of characters and numbers, see validate_batch
+
+    :raises ValidationError: with all the violations, if there are any
+    """
+    violations = validate_batch(characters, numbers)
+    if violations:
+        raise ValidationError(violations)
+
+
+# retries (with exponential backoff, in seconds) of compare_and_set when someone else changed the character
+CAS_RETRIES = 5
+CAS_BACKOFF = 0.1
+
+
+class ConflictError(requests.HTTPError):
+    """The number of a character could not be set, because it kept changing"""
+
+
+# the resolved addresses of the endpoints are shared by all processes (every Ansible task) of the user for a short time
+DNS_CACHE_DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'demoapi')
+DNS_CACHE_FILE = os.path.join(DNS_CACHE_DIRECTORY, 'dns-cache.json')
+DNS_CACHE_TTL = 60
+
+# seconds to wait for the request that opens the first connection
+
+
+def trusted(stat: os.stat_result) -> bool:
+    """Only trust a cache (folder) of this user that others can not read or change."""
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        return False
+    return not stat.st_mode & 0o077
+
+
+def load_dns_cache() -> dict:
+    """Load the cache with the resolved addresses, empty if there is no (trusted) cache."""
+    try:
+        handle = os.open(DNS_CACHE_FILE, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        return {}
+    with os.fdopen(handle, encoding='utf-8') as file:
+        try:
+            if not trusted(os.fstat(file.fileno())) or not trusted(os.stat(DNS_CACHE_DIRECTORY)):
+                return {}
+            cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_dns_cache(cache: dict) -> None:
+    """Save the cache with the resolved addresses, only readable and writable by this user."""
+    try:
+        os.makedirs(DNS_CACHE_DIRECTORY, mode=0o700, exist_ok=True)
+        if not trusted(os.stat(DNS_CACHE_DIRECTORY)):
+            return
+        handle, temp_file = tempfile.mkstemp(dir=DNS_CACHE_DIRECTORY, prefix='.dns-cache-')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as file:
+                json.dump(cache, file)
+            os.replace(temp_file, DNS_CACHE_FILE)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+    except OSError:
+        pass  # without a cache the next process resolves the host again
+
+
+def resolve(host: str, port: int, ttl: int = DNS_CACHE_TTL) -> List[str]:
+    """
+    Resolve the addresses of a host, with a cache (file) that is shared between the processes of the user
+
+    :param host: the host to resolve
+    :param port: the port that will be used
+    :param ttl: seconds the resolved addresses are kept in the cache
+    :returns: the addresses of the host
+    :raises OSError: if the host can not be resolved
+    """
+    key = f'{host}:{port}'
+    cache = load_dns_cache()
+    entry = cache.get(key)
+    try:
+        if entry['expires'] > time.time() and all(isinstance(address, str) for address in entry['addresses']):
+            return list(entry['addresses'])
+    except (KeyError, TypeError):
+        pass
+    addresses = list(dict.fromkeys(
+        info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    cache[key] = {'addresses': addresses, 'expires': time.time() + ttl}
+    save_dns_cache(cache)
+    return addresses
+
+
+def connect_failed(error: requests.ConnectionError) -> bool:
+    """Check if a connection error happened while connecting, so nothing is sent yet."""
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+
+class PinnedAdapter(requests.adapters.HTTPAdapter):
+    """
+    Adapter that connects to addresses that are already resolved, the host name is
+    still used for the Host header, SNI and the check of the certificate. If an address
+    can not be connected to, the next one is tried and at last the host name is resolved as usual
+
+    :param addresses: the addresses to connect to, in order
+    """
+
+    def __init__(self, addresses: List[str], **kwargs):
+        self.addresses = list(addresses)
+        super().__init__(**kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if not self.addresses:
+            return host_params, pool_kwargs
+        if host_params['scheme'] == 'https':
+            pool_kwargs['server_hostname'] = host_params['host']
+        return dict(host_params, host=self.addresses[0]), pool_kwargs
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        while True:
+            try:
+                return super().send(request, **kwargs)
+            except requests.ConnectionError as error:
+                if not self.addresses or not connect_failed(error):
+                    raise
+                # the (cached) address does not work (anymore), the request is not sent yet
+                self.addresses.pop(0)
+
+    def add_headers(self, request, **kwargs):
+        request.headers.setdefault('Host', urlparse(request.url).netloc)
+
+
 class DemoApi:
     """
     A simple demo class where the API logic is written
@@ -27,12 +206,15 @@ class DemoApi:
     :param password: password from the user
     :param token: token can be user instead of username/password
     :param uri: the endpoint of the API
+    :param warm_up: resolve the endpoint with the shared address cache before the first call
     :raises HTTPError: if one occurred
     """
 
-    def __init__(self, username: str, password: str, token: str, uri: str):
+    def __init__(self, username: str, password: str, token: str, uri: str, warm_up: bool = False):
         self.uri = uri
         self.session = requests.session()
+        if warm_up:
+            self.warm_up()
         self.__connect(username, password, token)
 
     def __connect(self, username: str, password: str, token: str):
@@ -44,6 +226,20 @@ class DemoApi:
             response.raise_for_status()
             self.session.headers.update({'X-Auth-Token': response.text})
 
+    def warm_up(self) -> None:
+        """
+        Resolve the host of the endpoint with the shared address cache and connect the session to
+        those addresses, so the calls do not wait for DNS
+        """
+        url = urlparse(self.uri)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        prefix = f'{url.scheme}://{url.netloc}/'
+        try:
+            addresses = resolve(url.hostname, port)
+        except OSError:
+            return  # the first call will resolve (and report) it
+        self.session.mount(prefix, PinnedAdapter(addresses))
+
     def reset(self, character: str) -> None:
         """
         Reset will remove character from the set of characters that are set
@@ -95,6 +291,66 @@ class DemoApi:
         response.raise_for_status()
         return json.loads(response.text)
 
+    def current(self, character: str) -> Optional[int]:
+        """
+        Get the number that is set on a character, None if it is not set
+
+        :param character: character where you want the number from
+
+        :returns: the number of the character or None
+        :raises HTTPError: if one occurred
+        """
+        try:
+            return self.get(character)
+        except requests.HTTPError as error:
+            if error.response is not None and error.response.status_code in (401, 403):
+                raise
+            if character in self.list():
+                raise
+            return None
+
+    def compare_and_set(self, character: str, expected: Optional[int], number: int,
+                        retries: int = CAS_RETRIES, backoff: float = CAS_BACKOFF) -> bool:
+        """
+        Set the number on a character that is expected to have the expected number (None if not set)
+
+        The API has no conditional write, the expected number decides between set and update.
+        If that fails because someone else changed the character, it is read again and
+        retried (with backoff) from the new number, until the character has the number.
+
+        :param character: character to set
+        :param expected: the number the character has now, None if it is not set
+        :param number: the number that will be given to the character
+        :param retries: the maximum number of retries
+        :param backoff: seconds to wait before the first retry, doubles every retry
+
+        :returns: True if the number is written, False if the character already has the number
+        :raises ValidationError: if the character or number is not valid, before any call is made
+        :raises ConflictError: if the character still changes after all retries
+        :raises HTTPError: if one occurred
+        """
+        # the API gives the same error for invalid input as for a conflict, so check it first
+        check_batch([character], [number])
+        attempt = 0
+        while expected != number:
+            try:
+                if expected is None:
+                    self.set(character, number)
+                else:
+                    self.update(character, number)
+                return True
+            except requests.HTTPError as error:
+                if error.response is not None and error.response.status_code in (401, 403):
+                    raise
+                if attempt >= retries:
+                    raise ConflictError(
+                        f'Character {character} changed during {attempt + 1} attempts to set it to {number}',
+                        response=error.response) from error
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+            attempt += 1
+            expected = self.current(character)
+        return False
+
     def list(self) -> List[str]:
         """
         Get the list of characters that are set
@@ -120,8 +376,16 @@ options:
     endpoint:
         description: The uri of the API
         type: str
-        required: true
+        required: false
         sample: 'http://localhost:5041/'
+    endpoints:
+        description:
+            - The uris of multiple APIs, the action is done on all of them at the same time.
+            - Use this or I(endpoint).
+        type: list
+        elements: str
+        required: false
+        sample: ['http://localhost:5041/', 'http://localhost:5042/']
     username:
         description: Username to get a token
         type: str
@@ -154,6 +418,50 @@ options:
         default: get
         choices: [ get, set, clear ]
         sample: 'set'
+    progress_file:
+        description:
+            - File to write the progress to while the changes are made, the characters processed, remaining and the rate.
+            - Use it together with C(async) and C(poll) to follow a long running task.
+            - If a clear with the same arguments was interrupted (less than an hour ago) and the characters are not changed by someone else since,
+              the next run continues and reports the changes of both runs.
+            - A run is only continued when the process of the interrupted run is not running anymore,
+              do not use the same progress_file for runs on the same endpoint at the same time.
+        type: path
+        required: false
+        sample: '/tmp/api_demo.progress'
+    warm_up:
+        description:
+            - Resolve the endpoint before the first call, the calls connect to the resolved addresses in order.
+            - The resolved addresses are cached for a short time in C(~/.cache/demoapi) and shared with the next tasks of the same user, so they do not resolve the endpoint again.
+        type: bool
+        required: false
+        default: false
+        sample: true
+    diff_format:
+        description:
+            - The format of the diff, C(full) with the before and after state, or C(compact) with only the changes.
+            - A compact diff is a list of [method, character, before, after], the method is set, update or reset.
+            - The changes are also shown as text (prepared) with C(--diff).
+            - The number before a reset is not read, so it is null.
+        type: str
+        required: false
+        default: full
+        choices: [ full, compact ]
+        sample: compact
+    diff_max_keys:
+        description:
+            - The maximum number of changes (by endpoint) in a compact diff, the number of changes that are left out is in omitted.
+            - Must be 0 or more, 100 if not given. Only with C(diff_format=compact).
+        type: int
+        required: false
+        sample: 10
+    diff_file:
+        description:
+            - File to write all changes of a compact diff to (by endpoint), also the ones that are left out of the result.
+            - Only with C(diff_format=compact). The file is also written in check mode, with the changes that would be made.
+        type: path
+        required: false
+        sample: '/tmp/api_demo.diff'
 '''
 
 EXAMPLES = r'''
@@ -181,6 +489,49 @@ EXAMPLES = r'''
     character: "A"
     action: get
   delegate_to: localhost
+
+- name: Set number on a character on multiple APIs at the same time
+  api_demo:
+    endpoints:
+      - http://localhost:5041/
+      - http://localhost:5042/
+    token: secret
+    character: "A"
+    number: 4
+    action: set
+  delegate_to: localhost
+
+- name: Clear all characters on multiple APIs with a small result, all changes are in a file
+  api_demo:
+    endpoints:
+      - http://localhost:5041/
+      - http://localhost:5042/
+    token: secret
+    action: clear
+    diff_format: compact
+    diff_max_keys: 5
+    diff_file: /tmp/api_demo_clear.diff
+  delegate_to: localhost
+
+- name: Clear all characters in the background and write the progress
+  api_demo:
+    endpoint: http://localhost:5041/
+    token: secret
+    action: clear
+    progress_file: /tmp/api_demo_clear.progress
+  async: 600
+  poll: 0
+  register: clear_job
+  delegate_to: localhost
+
+- name: Wait until all characters are cleared
+  ansible.builtin.async_status:
+    jid: "{{ clear_job.ansible_job_id }}"
+  register: clear_result
+  until: clear_result.finished
+  retries: 60
+  delay: 5
+  delegate_to: localhost
 '''
 
 RETURN = r'''
@@ -193,21 +544,376 @@ number:
     description: The number that is set or get
     type: int
     sample: 5
+endpoint_results:
+    description: The result (changed, exists, number, diff, progress) by endpoint, without the diff if diff_format is compact
+    returned: when endpoints is used
+    type: dict
+    sample: {'http://localhost:5041/': {'changed': True, 'exists': True, 'number': 4}}
+progress:
+    description: The progress of the changes, the same as written to the progress_file
+    returned: when progress_file is used
+    type: dict
+    sample: {'processed': 2, 'remaining': 0, 'rate': 40.5, 'done': ['A', 'B'], 'finished': True}
 '''
 
 
+# the maximum number of endpoints that are called at the same time
+MAX_WORKERS = 16
+
+# seconds an interrupted run can be continued
+PROGRESS_MAX_AGE = 3600
+DIFF_MAX_KEYS = 100
+
+
+def render_change(change: list) -> str:
+    """A change of a compact diff ([method, character, before, after]) as a line of text."""
+    method, character, before, after = change
+    if method == 'update':
+        return f'update {character}: {before} -> {after}'
+    if method == 'set':
+        return f'set {character}: {after}'
+    return f'{method} {character}'
+
+
+def compact_diffs(results: Dict[str, dict], max_keys: int, diff_file: Optional[str]) -> None:
+    """
+    Keep at most max_keys changes in the compact diff of every endpoint result,
+    all changes are written to the diff_file (if given). The changes are also
+    rendered as text in prepared, so Ansible shows them with --diff.
+    """
+    all_changes = {}
+    for endpoint, endpoint_result in results.items():
+        diff = endpoint_result.get('diff')
+        if not diff:
+            continue
+        changes = diff['changes']
+        all_changes[endpoint] = changes
+        lines = [endpoint] + [render_change(change) for change in changes[:max_keys]]
+        if len(changes) > max_keys:
+            diff['changes'] = changes[:max_keys]
+            diff['omitted'] = len(changes) - max_keys
+            lines.append(f'... {diff["omitted"]} more changes')
+            if diff_file:
+                diff['file'] = diff_file
+                lines[-1] += f' in {diff_file}'
+        diff['prepared'] = '\n'.join(lines) + '\n'
+    if diff_file:
+        with open(diff_file, 'w', encoding='utf-8') as file:
+            json.dump({'endpoints': all_changes}, file)
+
+
+def merge_results(result: dict, endpoint_results: Dict[str, dict], compact: bool) -> None:
+    """
+    Put the results of the endpoints in the result of the module, the module is changed if
+    one of the endpoints is changed and the diffs of the endpoints are combined
+    """
+    result['endpoint_results'] = endpoint_results
+    result['diff'] = []
+    for endpoint, endpoint_result in endpoint_results.items():
+        result['changed'] = result['changed'] or endpoint_result['changed']
+        if endpoint_result.get('diff'):
+            result['diff'].append(dict(endpoint_result['diff'], before_header=endpoint, after_header=endpoint))
+            if compact:
+                # do not return the same diff twice
+                del endpoint_result['diff']
+
+
+def plan_action(demo_api: DemoApi, character_list: List[str], action: str,
+                character: Optional[str], number: Optional[int]) -> Tuple[dict, List[list]]:
+    """
+    Compare the current state with the wanted state, without making any changes
+
+    :returns: the state for the result (changed, exists, number, diff) and the changes as [method, character, number, expected]
+    """
+    state = {'changed': False, 'diff': None}
+    changes = []
+    if action == 'get':
+        # only get from API that is in the list
+        if character in character_list:
+            state['number'] = demo_api.get(character)
+            state['exists'] = True
+        else:
+            state['exists'] = False
+    elif action == 'set':
+        if character in character_list:
+            current_number = demo_api.get(character)
+            if current_number != number:
+                changes.append(['update', character, number, current_number])
+                state['changed'] = True
+                state['diff'] = {'before': {
+                    'character': character,
+                    'number': current_number
+                },
+                    'after': {
+                    'character': character,
+                    'number': number
+                }
+                }
+        else:
+            changes.append(['set', character, number, None])
+            state['changed'] = True
+            state['diff'] = {'before': {
+                'character': None,
+                'number': None
+            },
+                'after': {
+                'character': character,
+                'number': number
+            }
+            }
+        state['number'] = number
+        state['exists'] = True
+    elif action == 'clear':
+        for character_clear in character_list:
+            changes.append(['reset', character_clear, None, None])
+            state['changed'] = True
+            state['exists'] = False
+            state['diff'] = {'before': {
+                'character_list': character_list
+            },
+                'after': {
+                'character_list': None
+            }
+            }
+    return state, changes
+
+
+def process_start(pid: int) -> Optional[int]:
+    """
+    The start time of a process, so a process is not mistaken for an earlier one with the same pid
+
+    :param pid: the id of the process
+    :returns: the start time (in clock ticks since boot, 0 without /proc) or None if the process is not running
+    """
+    if not os.path.exists('/proc/self/stat'):
+        try:
+            os.kill(pid, 0)
+        except ProcessLookupError:
+            return None
+        except PermissionError:
+            pass  # running, as another user
+        return 0
+    try:
+        with open(f'/proc/{pid}/stat', encoding='utf-8') as file:
+            # the fields after the name (that can have spaces), the start time is field 22
+            return int(file.read().rsplit(')', 1)[1].split()[19])
+    except (OSError, IndexError, ValueError):
+        return None
+
+
+def running(owner: list) -> bool:
+    """Check if the owner ([pid, start time]) of a progress is still running."""
+    pid, start = owner
+    current = process_start(pid)
+    return current is not None and (current == start or not current)
+
+
+class Progress:
+    """
+    Keep track of the changes that are made and write them to a file, so a long running
+    (async) task can be followed and continued after an interruption
+
+    :param progress_file: file where the progress is written to
+    :param endpoint: the endpoint the changes are made on
+    :param arguments: the action, character and number, a run is only continued with the same arguments
+
+    The progress of a run is owned by its process, a run is only continued when that process is not running anymore.
+    """
+
+    def __init__(self, progress_file: str, endpoint: str, arguments: list):
+        self.progress_file = progress_file
+        self.endpoint = endpoint
+        self.arguments = arguments
+        self.done = []
+        self.planned = []
+        self.remaining = 0
+        self.started = time.monotonic()
+        self.processed_run = 0
+        self.last = {}
+        self.owner = [os.getpid(), process_start(os.getpid())]
+        self.previous = self.__load().get(endpoint)
+
+    def __load(self) -> Dict[str, dict]:
+        if not os.path.exists(self.progress_file):
+            return {}
+        try:
+            with open(self.progress_file, encoding='utf-8') as file:
+                progress = json.load(file)['endpoints']
+        except (ValueError, KeyError, TypeError):
+            return {}  # not a progress file (of this version), start again
+        return progress if isinstance(progress, dict) else {}
+
+    def resume(self, character_list: List[str]) -> List[str]:
+        """
+        Continue an interrupted clear, if it is recent, the process that made it is not running
+        and the characters that are left are the ones it did not clear yet
+
+        :param character_list: the characters that are set now
+        :returns: the characters that are cleared by the interrupted run
+        """
+        previous = self.previous
+        try:
+            if (previous['finished'] or previous['arguments'] != self.arguments
+                    or previous['updated'] < time.time() - PROGRESS_MAX_AGE or running(previous['owner'])):
+                return []
+            done, planned = list(previous['done']), set(previous['planned'])
+        except (KeyError, TypeError, ValueError):
+            return []
+        if not set(character_list) <= planned - set(done):
+            return []  # the characters are changed by someone else since
+        self.done = done
+        return list(done)
+
+    def state(self, finished: bool = False) -> dict:
+        """The progress as it is written to the file."""
+        elapsed = time.monotonic() - self.started
+        return {
+            'arguments': self.arguments,
+            'owner': self.owner,
+            'processed': len(self.done),
+            'remaining': self.remaining,
+            'rate': round(self.processed_run / elapsed, 2) if elapsed > 0 else 0.0,
+            'done': self.done,
+            'planned': self.planned,
+            'finished': finished,
+            'updated': time.time()
+        }
+
+    def write(self, finished: bool = False) -> None:
+        """
+        Write (and keep as last) the progress, locked for other tasks and threads that use the same file,
+        and replace the file in one go so a reader never sees half a file
+        """
+        directory = os.path.dirname(os.path.abspath(self.progress_file))
+        with open(f'{self.progress_file}.lock', 'a', encoding='utf-8') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            progress = self.__load()
+            self.last = progress[self.endpoint] = self.state(finished)
+            handle, temp_file = tempfile.mkstemp(dir=directory, prefix='.api_demo-')
+            try:
+                with os.fdopen(handle, 'w', encoding='utf-8') as file:
+                    json.dump({'endpoints': progress}, file)
+                os.replace(temp_file, self.progress_file)
+            except BaseException:
+                os.remove(temp_file)
+                raise
+
+    def start(self, characters: List[str]) -> None:
+        """Start with the characters that must be changed."""
+        self.planned = self.done + characters
+        self.remaining = len(characters)
+        self.started = time.monotonic()
+        self.write()
+
+    def step(self, character: str) -> None:
+        """A change on a character is made."""
+        self.done.append(character)
+        self.remaining -= 1
+        self.processed_run += 1
+        self.write()
+
+
+def apply_changes(demo_api: DemoApi, changes: List[list], progress: Optional[Progress] = None) -> List[list]:
+    """
+    Make the planned changes on the API
+
+    :returns: the changes that are written, without the ones someone else already made
+    """
+    written = []
+    if progress:
+        progress.start([change[1] for change in changes])
+    for change in changes:
+        method, character, number, expected = change
+        if method in ('update', 'set'):
+            # someone else can change the character after it was read (or planned)
+            if demo_api.compare_and_set(character, expected, number):
+                written.append(change)
+        elif method == 'reset':
+            demo_api.reset(character)
+            written.append(change)
+        if progress:
+            progress.step(character)
+    if progress:
+        progress.write(finished=True)
+    return written
+
+
+def reconcile(endpoint: str, params: dict, check_mode: bool) -> dict:
+    """
+    Do the action on one endpoint
+
+    :param endpoint: the uri of the API
+    :param params: the arguments of the module
+    :param check_mode: only compare, do not make any changes
+    :returns: the result (changed, exists, number, diff, progress)
+    :raises HTTPError: if one occurred
+    """
+    action = params['action']
+    character = params['character']
+    number = params['number']
+
+    demo_api = DemoApi(params['username'], params['password'], params['token'], endpoint, params['warm_up'])
+
+    character_list = demo_api.list()
+    result = {}
+    state, changes = plan_action(demo_api, character_list, action, character, number)
+
+    progress = None
+    resumed = []
+    if params['progress_file'] and not check_mode:
+        progress = Progress(params['progress_file'], endpoint, [action, character, number])
+        # a set is one change, only a clear can be continued
+        resumed = progress.resume(character_list) if action == 'clear' else []
+        if resumed:
+            # an earlier run with the same arguments was interrupted,
+            # the changes it already made are part of this task
+            state['changed'] = True
+            state['exists'] = False
+            state['diff'] = {'before': {
+                'character_list': resumed + character_list
+            },
+                'after': {
+                'character_list': None
+            }
+            }
+    result.update(state)
+    if params['diff_format'] == 'compact' and result['diff']:
+        # only the changes, as [method, character, before, after]
+        result['diff'] = {'changes': [['reset', character_done, None, None] for character_done in resumed]
+                          + [[method, character_change, expected, number_change]
+                             for method, character_change, number_change, expected in changes]}
+
+    # if the user is working with this module in only check mode,
+    # we do not want to make any changes to the environment.
+    if not check_mode:
+        written = apply_changes(demo_api, changes, progress)
+        if action == 'set' and changes and not written and not resumed:
+            # someone else set the number in the meantime, nothing is changed by this task
+            result['changed'] = False
+            result['diff'] = None
+        if progress:
+            result['progress'] = progress.last
+    return result
+
+
 def run_module() -> None:
     """The Ansible module."""
 
     # define the available arguments/parameters that a user can pass to the module
     module_args = {
-        'endpoint': {'type': 'str', 'required': True},
+        'endpoint': {'type': 'str', 'required': False},
+        'endpoints': {'type': 'list', 'elements': 'str', 'required': False},
         'username': {'type': 'str', 'required': False},
         'password': {'type': 'str', 'required': False, 'no_log': True},
         'token': {'type': 'str', 'required': False, 'no_log': True},
         'character': {'type': 'str', 'required': False},
         'number': {'type': 'int', 'required': False},
-        'action': {'type': 'str', 'required': True, 'choices': ['get', 'set', 'clear']}
+        'action': {'type': 'str', 'required': True, 'choices': ['get', 'set', 'clear']},
+        'progress_file': {'type': 'path', 'required': False},
+        'warm_up': {'type': 'bool', 'required': False, 'default': False},
+        'diff_format': {'type': 'str', 'required': False, 'default': 'full', 'choices': ['full', 'compact']},
+        'diff_max_keys': {'type': 'int', 'required': False},
+        'diff_file': {'type': 'path', 'required': False}
     }
 
     # use username with password
@@ -215,11 +921,11 @@ def run_module() -> None:
         ('username', 'password')
     ]
 
-    # use username/password or token is needed
-    check_required_one_of = [('username', 'token')]
+    # use username/password or token is needed, and endpoint or endpoints
+    check_required_one_of = [('username', 'token'), ('endpoint', 'endpoints')]
 
-    # use username/password or token, only one
-    check_mutually_exclusive = [('username', 'token')]
+    # use username/password or token, only one, and endpoint or endpoints
+    check_mutually_exclusive = [('username', 'token'), ('endpoint', 'endpoints')]
 
     # if action == get, we need the character argument
     # if action == set, we need the character and number arguments
@@ -253,83 +959,54 @@ def run_module() -> None:
     }
 
     endpoint = module.params['endpoint']
-    username = module.params['username']
-    password = module.params['password']
-    token = module.params['token']
+    endpoints = module.params['endpoints']
     character = module.params['character']
     number = module.params['number']
     action = module.params['action']
-
-    # input checks
-    if character is not None and not re.fullmatch(r"[A-Z]", character):
-        module.fail_json(
-            msg=f'character: "{character}" must be an alpha letter and in upper case', **result)
-    if number is not None and not 1 <= number <= 255:
-        module.fail_json(msg='number must be between 1 and 255', **result)
-
-    demo_api = DemoApi(username, password, token, endpoint)
-
-    # actions
-    if action == 'get':
-        # only get from API that is in the list
-        character_list = demo_api.list()
-        if character in character_list:
-            result['number'] = demo_api.get(character)
-            result['exists'] = True
-        else:
-            result['exists'] = False
-    elif action == 'set':
-        character_list = demo_api.list()
-        if character in character_list:
-            current_number = demo_api.get(character)
-            if current_number != number:
-                # if the user is working with this module in only check mode,
-                # we do not want to make any changes to the environment.
-                if not module.check_mode:
-                    demo_api.update(character, number)
-                result['changed'] = True
-                result['diff'] = {'before': {
-                    'character': character,
-                    'number': current_number
-                },
-                    'after': {
-                    'character': character,
-                    'number': number
-                }
-                }
-        else:
-            # if the user is working with this module in only check mode,
-            # we do not want to make any changes to the environment.
-            if not module.check_mode:
-                demo_api.set(character, number)
-            result['changed'] = True
-            result['diff'] = {'before': {
-                'character': None,
-                'number': None
-            },
-                'after': {
-                'character': character,
-                'number': number
-            }
-            }
-        result['number'] = number
-        result['exists'] = True
-    elif action == 'clear':
-        character_list = demo_api.list()
-        for character_clear in character_list:
-            # if the user is working with this module in only check mode
-            # we do not want to make any changes to the environment.
-            if not module.check_mode:
-                demo_api.reset(character_clear)
-            result['changed'] = True
-            result['exists'] = False
-            result['diff'] = {'before': {
-                'character_list': character_list
-            },
-                'after': {
-                'character_list': None
-            }
-            }
+    compact = module.params['diff_format'] == 'compact'
+    diff_max_keys = module.params['diff_max_keys']
+
+    # input checks, report all the violations at once
+    violations = validate_batch([] if character is None else [character],
+                                [] if number is None else [number])
+    if violations:
+        module.fail_json(msg='; '.join(violations), **result)
+    if not compact and (diff_max_keys is not None or module.params['diff_file']):
+        module.fail_json(msg='diff_max_keys and diff_file can only be used with diff_format compact', **result)
+    if diff_max_keys is None:
+        diff_max_keys = DIFF_MAX_KEYS
+    if diff_max_keys < 0:
+        module.fail_json(msg='diff_max_keys must be 0 or more', **result)
+    if endpoints is not None and not endpoints:
+        module.fail_json(msg='endpoints must have at least one endpoint', **result)
+
+    failed = []
+
+    if endpoints is None:
+        result.update(reconcile(endpoint, module.params, module.check_mode))
+        if compact:
+            compact_diffs({endpoint: result}, diff_max_keys, module.params['diff_file'])
+    else:
+        # the same action on all endpoints at the same time
+        endpoints = list(dict.fromkeys(endpoints))
+        with ThreadPoolExecutor(max_workers=min(MAX_WORKERS, len(endpoints))) as executor:
+            futures = {endpoint_item: executor.submit(reconcile, endpoint_item, module.params, module.check_mode)
+                       for endpoint_item in endpoints}
+        endpoint_results = {}
+        for endpoint_item, future in futures.items():
+            try:
+                endpoint_results[endpoint_item] = future.result()
+            except Exception as error:  # pylint: disable=broad-except
+                # the other endpoints can be changed already, report them all
+                endpoint_results[endpoint_item] = {'changed': False, 'failed': True,
+                                                   'msg': f'{type(error).__name__}: {error}'}
+                failed.append(endpoint_item)
+        if compact:
+            compact_diffs(endpoint_results, diff_max_keys, module.params['diff_file'])
+        merge_results(result, endpoint_results, compact)
+
+    if failed:
+        module.fail_json(msg=f'failed on endpoints: {", ".join(failed)}', **result)
 
     result['rc'] = 0  # we are at the end, no errors occurred
     module.exit_json(**result)
@@ -1,9 +1,214 @@
 """Module providing calls to the demo api."""
 
-from typing import List
-from urllib.parse import urljoin
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional
+from urllib.parse import urljoin, urlparse
+from urllib3.exceptions import NewConnectionError
+import argparse
 import json
+import os
+import random
+import socket
+import string
+import tempfile
+import time
 import requests
+import requests.adapters
+
+
+# the same checks as the InputChecker of the API
+VALID_CHARACTERS = frozenset(string.ascii_uppercase)
+VALID_NUMBERS = range(1, 256)
+
+
+class ValidationError(ValueError):
+    """
+    Input that the API will not accept, raised before any call is made
+
+    :param violations: all the violations that are found
+    """
+
+    def __init__(self, violations: List[str]):
+        super().__init__('; '.join(violations))
+        self.violations = violations
+
+
+def validate_batch(characters: Iterable[str] = (), numbers: Iterable[int] = ()) -> List[str]:
+    """
+    Check a whole batch of characters and numbers in one pass, without calling the API
+
+    :param characters: characters (keys) to check
+    :param numbers: numbers (values) to check
+    :returns: all the violations, empty if the batch is valid
+    """
+    violations = [f'character: "{character}" must be an alpha letter and in upper case'
+                  for character in characters
+                  if not isinstance(character, str) or character not in VALID_CHARACTERS]
+    violations.extend(f'number: {number} must be between 1 and 255'
+                      for number in numbers
+                      if type(number) is not int or number not in VALID_NUMBERS)  # pylint: disable=unidiomatic-typecheck
+    return violations
+
+
+def check_batch(characters: Iterable[str] = (), numbers: Iterable[int] = ()) -> None:
+    """
+    Check a whole batch of characters and numbers, see validate_batch
+
+    :raises ValidationError: with all the violations, if there are any
+    """
+    violations = validate_batch(characters, numbers)
+    if violations:
+        raise ValidationError(violations)
+
+
+class Change(NamedTuple):
+    """A character that is added, changed or removed"""
+    event: str
+    character: str
+    before: Optional[int]
+    after: Optional[int]
+
+
+def diff_snapshots(before: Dict[str, int], after: Dict[str, int]) -> List[Change]:
+    """
+    Compare two snapshots of the characters with their numbers
+
+    :param before: the previous snapshot
+    :param after: the current snapshot
+    :returns: the added, changed and removed characters
+    """
+    changes = [Change('added', character, None, number)
+               for character, number in after.items() if character not in before]
+    changes.extend(Change('changed', character, before[character], number)
+                   for character, number in after.items()
+                   if character in before and before[character] != number)
+    changes.extend(Change('removed', character, number, None)
+                   for character, number in before.items() if character not in after)
+    return changes
+
+
+# retries (with exponential backoff, in seconds) of compare_and_set when someone else changed the character
+CAS_RETRIES = 5
+CAS_BACKOFF = 0.1
+
+
+class ConflictError(requests.HTTPError):
+    """The number of a character could not be set, because it kept changing"""
+
+
+# the resolved addresses of the endpoints are shared by all processes (every Ansible task) of the user for a short time
+DNS_CACHE_DIRECTORY = os.path.join(
+    os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'demoapi')
+DNS_CACHE_FILE = os.path.join(DNS_CACHE_DIRECTORY, 'dns-cache.json')
+DNS_CACHE_TTL = 60
+
+# seconds to wait for the request that opens the first connection
+
+
+def trusted(stat: os.stat_result) -> bool:
+    """Only trust a cache (folder) of this user that others can not read or change."""
+    if hasattr(os, 'getuid') and stat.st_uid != os.getuid():
+        return False
+    return not stat.st_mode & 0o077
+
+
+def load_dns_cache() -> dict:
+    """Load the cache with the resolved addresses, empty if there is no (trusted) cache."""
+    try:
+        handle = os.open(DNS_CACHE_FILE, os.O_RDONLY | getattr(os, 'O_NOFOLLOW', 0))
+    except OSError:
+        return {}
+    with os.fdopen(handle, encoding='utf-8') as file:
+        try:
+            if not trusted(os.fstat(file.fileno())) or not trusted(os.stat(DNS_CACHE_DIRECTORY)):
+                return {}
+            cache = json.load(file)
+        except (OSError, ValueError):
+            return {}
+    return cache if isinstance(cache, dict) else {}
+
+
+def save_dns_cache(cache: dict) -> None:
+    """Save the cache with the resolved addresses, only readable and writable by this user."""
+    try:
+        os.makedirs(DNS_CACHE_DIRECTORY, mode=0o700, exist_ok=True)
+        if not trusted(os.stat(DNS_CACHE_DIRECTORY)):
+            return
+        handle, temp_file = tempfile.mkstemp(dir=DNS_CACHE_DIRECTORY, prefix='.dns-cache-')
+        try:
+            with os.fdopen(handle, 'w', encoding='utf-8') as file:
+                json.dump(cache, file)
+            os.replace(temp_file, DNS_CACHE_FILE)
+        except BaseException:
+            os.remove(temp_file)
+            raise
+    except OSError:
+        pass  # without a cache the next process resolves the host again
+
+
+def resolve(host: str, port: int, ttl: int = DNS_CACHE_TTL) -> List[str]:
+    """
+    Resolve the addresses of a host, with a cache (file) that is shared between the processes of the user
+
+    :param host: the host to resolve
+    :param port: the port that will be used
+    :param ttl: seconds the resolved addresses are kept in the cache
+    :returns: the addresses of the host
+    :raises OSError: if the host can not be resolved
+    """
+    key = f'{host}:{port}'
+    cache = load_dns_cache()
+    entry = cache.get(key)
+    try:
+        if entry['expires'] > time.time() and all(isinstance(address, str) for address in entry['addresses']):
+            return list(entry['addresses'])
+    except (KeyError, TypeError):
+        pass
+    addresses = list(dict.fromkeys(
+        info[4][0] for info in socket.getaddrinfo(host, port, type=socket.SOCK_STREAM)))
+    cache[key] = {'addresses': addresses, 'expires': time.time() + ttl}
+    save_dns_cache(cache)
+    return addresses
+
+
+def connect_failed(error: requests.ConnectionError) -> bool:
+    """Check if a connection error happened while connecting, so nothing is sent yet."""
+    reason = getattr(error.args[0], 'reason', None) if error.args else None
+    return isinstance(error, requests.ConnectTimeout) or isinstance(reason, NewConnectionError)
+
+
+class PinnedAdapter(requests.adapters.HTTPAdapter):
+    """
+    Adapter that connects to addresses that are already resolved, the host name is
+    still used for the Host header, SNI and the check of the certificate. If an address
+    can not be connected to, the next one is tried and at last the host name is resolved as usual
+
+    :param addresses: the addresses to connect to, in order
+    """
+
+    def __init__(self, addresses: List[str], **kwargs):
+        self.addresses = list(addresses)
+        super().__init__(**kwargs)
+
+    def build_connection_pool_key_attributes(self, request, verify, cert=None):
+        host_params, pool_kwargs = super().build_connection_pool_key_attributes(request, verify, cert)
+        if not self.addresses:
+            return host_params, pool_kwargs
+        if host_params['scheme'] == 'https':
+            pool_kwargs['server_hostname'] = host_params['host']
+        return dict(host_params, host=self.addresses[0]), pool_kwargs
+
+    def send(self, request, **kwargs):  # pylint: disable=arguments-differ
+        while True:
+            try:
+                return super().send(request, **kwargs)
+            except requests.ConnectionError as error:
+                if not self.addresses or not connect_failed(error):
+                    raise
+                # the (cached) address does not work (anymore), the request is not sent yet
+                self.addresses.pop(0)
+
+    def add_headers(self, request, **kwargs):
+        request.headers.setdefault('Host', urlparse(request.url).netloc)
 
 
 class DemoApi:
@@ -14,12 +219,15 @@ class DemoApi:
     :param password: password from the user
     :param token: token can be user instead of username/password
     :param uri: the endpoint of the API
+    :param warm_up: resolve the endpoint with the shared address cache before the first call
     :raises HTTPError: if one occurred
     """
 
-    def __init__(self, username: str, password: str, token: str, uri: str):
+    def __init__(self, username: str, password: str, token: str, uri: str, warm_up: bool = False):
         self.uri = uri
         self.session = requests.session()
+        if warm_up:
+            self.warm_up()
         self.__connect(username, password, token)
 
     def __connect(self, username: str, password: str, token: str):
@@ -31,6 +239,20 @@ class DemoApi:
             response.raise_for_status()
             self.session.headers.update({'X-Auth-Token': response.text})
 
+    def warm_up(self) -> None:
+        """
+        Resolve the host of the endpoint with the shared address cache and connect the session to
+        those addresses, so the calls do not wait for DNS
+        """
+        url = urlparse(self.uri)
+        port = url.port or (443 if url.scheme == 'https' else 80)
+        prefix = f'{url.scheme}://{url.netloc}/'
+        try:
+            addresses = resolve(url.hostname, port)
+        except OSError:
+            return  # the first call will resolve (and report) it
+        self.session.mount(prefix, PinnedAdapter(addresses))
+
     def reset(self, character: str) -> None:
         """
         Reset will remove character from the set of characters that are set
@@ -82,6 +304,66 @@ class DemoApi:
         response.raise_for_status()
         return json.loads(response.text)
 
+    def current(self, character: str) -> Optional[int]:
+        """
+        Get the number that is set on a character, None if it is not set
+
+        :param character: character where you want the number from
+
+        :returns: the number of the character or None
+        :raises HTTPError: if one occurred
+        """
+        try:
+            return self.get(character)
+        except requests.HTTPError as error:
+            if error.response is not None and error.response.status_code in (401, 403):
+                raise
+            if character in self.list():
+                raise
+            return None
+
+    def compare_and_set(self, character: str, expected: Optional[int], number: int,
+                        retries: int = CAS_RETRIES, backoff: float = CAS_BACKOFF) -> bool:
+        """
+        Set the number on a character that is expected to have the expected number (None if not set)
+
+        The API has no conditional write, the expected number decides between set and update.
+        If that fails because someone else changed the character, it is read again and
+        retried (with backoff) from the new number, until the character has the number.
+
+        :param character: character to set
+        :param expected: the number the character has now, None if it is not set
+        :param number: the number that will be given to the character
+        :param retries: the maximum number of retries
+        :param backoff: seconds to wait before the first retry, doubles every retry
+
+        :returns: True if the number is written, False if the character already has the number
+        :raises ValidationError: if the character or number is not valid, before any call is made
+        :raises ConflictError: if the character still changes after all retries
+        :raises HTTPError: if one occurred
+        """
+        # the API gives the same error for invalid input as for a conflict, so check it first
+        check_batch([character], [number])
+        attempt = 0
+        while expected != number:
+            try:
+                if expected is None:
+                    self.set(character, number)
+                else:
+                    self.update(character, number)
+                return True
+            except requests.HTTPError as error:
+                if error.response is not None and error.response.status_code in (401, 403):
+                    raise
+                if attempt >= retries:
+                    raise ConflictError(
+                        f'Character {character} changed during {attempt + 1} attempts to set it to {number}',
+                        response=error.response) from error
+            time.sleep(backoff * 2 ** attempt * random.uniform(0.5, 1.0))
+            attempt += 1
+            expected = self.current(character)
+        return False
+
     def list(self) -> List[str]:
         """
         Get the list of characters that are set
@@ -92,3 +374,94 @@ class DemoApi:
         response = self.session.get(urljoin(self.uri, "character"))
         response.raise_for_status()
         return json.loads(response.text)
+
+    def snapshot(self, previous: Optional[Dict[str, int]] = None) -> Dict[str, int]:
+        """
+        Get all characters that are set with their numbers
+
+        :param previous: the last snapshot, for the characters that are still set but could not be read
+        :returns: the number by character
+        :raises HTTPError: if one occurred
+        """
+        numbers = {}
+        for character in self.list():
+            try:
+                number = self.current(character)
+            except requests.HTTPError as error:
+                if error.response is not None and error.response.status_code in (401, 403):
+                    raise
+                # the character is still set, keep the number it had
+                number = (previous or {}).get(character)
+            # None if the character is removed after the list was made
+            if number is not None:
+                numbers[character] = number
+        return numbers
+
+    def watch(self, interval: float = 1.0, max_interval: float = 30.0, initial: bool = True) -> Iterator[Change]:
+        """
+        Poll the characters and only yield the ones that are added, changed or removed
+
+        The time between polls doubles while nothing changes (up to max_interval)
+        and goes back to interval after a change. When a poll fails the last snapshot
+        is kept and the time between polls doubles as well.
+
+        :param interval: seconds between polls after a change
+        :param max_interval: maximum seconds between polls
+        :param initial: yield the characters of the first poll as added
+        :returns: the changes, forever
+        :raises HTTPError: if the user is not (or no longer) allowed
+        """
+        previous = None
+        wait = interval
+        while True:
+            try:
+                current = self.snapshot(previous)
+            except requests.RequestException as error:
+                if error.response is not None and error.response.status_code in (401, 403):
+                    raise
+                # the API can not be reached (for now), poll again later
+                wait = min(wait * 2, max_interval)
+            else:
+                changes = diff_snapshots(previous or {}, current)
+                if previous is not None or initial:
+                    yield from changes
+                wait = interval if changes or previous is None else min(wait * 2, max_interval)
+                previous = current
+            time.sleep(wait)
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    """
+    Command line interface, for example: python demoapi.py --token secret watch
+
+    :param argv: the arguments, default the arguments of the command line
+    """
+    parser = argparse.ArgumentParser(description='Calls to the demo api')
+    parser.add_argument('--uri', default='http://localhost:5041/', help='the endpoint of the API')
+    parser.add_argument('--username', help='user that connect to API')
+    parser.add_argument('--password', default=os.environ.get('DEMOAPI_PASSWORD'),
+                        help='password from the user (default $DEMOAPI_PASSWORD)')
+    parser.add_argument('--token', default=os.environ.get('DEMOAPI_TOKEN'),
+                        help='token can be used instead of username/password (default $DEMOAPI_TOKEN)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+    watch_parser = subparsers.add_parser(
+        'watch', help='print the added, changed and removed characters as json lines')
+    watch_parser.add_argument('--interval', type=float, default=1.0,
+                              help='seconds between polls after a change')
+    watch_parser.add_argument('--max-interval', type=float, default=30.0,
+                              help='maximum seconds between polls')
+    watch_parser.add_argument('--no-initial', dest='initial', action='store_false',
+                              help='do not print the characters that are already set')
+    args = parser.parse_args(argv)
+
+    demo_api = DemoApi(args.username, args.password, args.token, args.uri)
+    if args.command == 'watch':
+        try:
+            for change in demo_api.watch(args.interval, args.max_interval, args.initial):
+                print(json.dumps(change._asdict()), flush=True)
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == '__main__':
+    main()
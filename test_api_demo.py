@@ -0,0 +1,226 @@
+"""Test module for the Ansible module api_demo (without the API)."""
+
+import json
+import os
+import sys
+import tempfile
+import time
+import unittest
+from concurrent.futures import ThreadPoolExecutor
+import requests
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'ansible-playbook', 'library'))
+import api_demo  # noqa: E402 pylint: disable=wrong-import-position
+
+
+class FakeDemoApi(api_demo.DemoApi):
+    """DemoApi that keeps the characters in memory, like the API does"""
+
+    def __init__(self, numbers: dict):  # pylint: disable=super-init-not-called
+        self.numbers = numbers
+
+    def __fail(self, message: str) -> None:
+        response = requests.Response()
+        response.status_code = 500
+        raise requests.HTTPError(message, response=response)
+
+    def reset(self, character: str) -> None:
+        if character not in self.numbers:
+            self.__fail(f'Character with id {character} not found')
+        del self.numbers[character]
+
+    def set(self, character: str, number: int) -> None:
+        if character in self.numbers:
+            self.__fail(f'Character with id {character} already exists')
+        self.numbers[character] = number
+
+    def update(self, character: str, number: int) -> None:
+        if character not in self.numbers:
+            self.__fail(f'Character with id {character} not found')
+        self.numbers[character] = number
+
+    def get(self, character: str) -> int:
+        if character not in self.numbers:
+            self.__fail(f'Character with id {character} not found')
+        return self.numbers[character]
+
+    def list(self) -> list:
+        return list(self.numbers)
+
+
+def arguments(**kwargs) -> dict:
+    """The arguments of the module, with defaults."""
+    params = {'username': None, 'password': None, 'token': 'secret', 'character': None, 'number': None,
+              'action': 'get', 'progress_file': None, 'warm_up': False,
+              'diff_format': 'full', 'diff_max_keys': None, 'diff_file': None}
+    params.update(kwargs)
+    return params
+
+
+class TestReconcile(unittest.TestCase):
+    """Test Class for the changes on one endpoint"""
+
+    def setUp(self):
+        self.numbers = {}
+        self.original = api_demo.DemoApi
+        api_demo.DemoApi = lambda *args: FakeDemoApi(self.numbers)
+
+    def tearDown(self):
+        api_demo.DemoApi = self.original
+
+    def test_plan_action(self) -> None:
+        """The changes of set and clear."""
+        demo_api = FakeDemoApi({'A': 1, 'B': 2})
+        state, changes = api_demo.plan_action(demo_api, ['A', 'B'], 'set', 'A', 5)
+        assert state['changed'] and changes == [['update', 'A', 5, 1]]
+        state, changes = api_demo.plan_action(demo_api, ['A', 'B'], 'set', 'A', 1)
+        assert not state['changed'] and not changes
+        state, changes = api_demo.plan_action(demo_api, ['A', 'B'], 'set', 'C', 1)
+        assert changes == [['set', 'C', 1, None]]
+        state, changes = api_demo.plan_action(demo_api, ['A', 'B'], 'clear', None, None)
+        assert changes == [['reset', 'A', None, None], ['reset', 'B', None, None]]
+
+    def test_set_by_someone_else(self) -> None:
+        """A set is not changed if someone else sets the same number after it was read."""
+        numbers = self.numbers
+
+        class RacingDemoApi(FakeDemoApi):
+            """Someone else sets A right after the list is read"""
+
+            def list(self) -> list:
+                characters = super().list()
+                numbers['A'] = 9
+                return characters
+
+        api_demo.DemoApi = lambda *args: RacingDemoApi(numbers)
+        result = api_demo.reconcile('http://api/', arguments(action='set', character='A', number=9), False)
+        assert not result['changed'] and result['diff'] is None
+        assert numbers['A'] == 9
+
+    def test_apply_already_set(self) -> None:
+        """A set that someone else already made is not reported as changed."""
+        demo_api = FakeDemoApi({'A': 5, 'B': 1})
+        written = api_demo.apply_changes(demo_api, [['set', 'A', 5, None], ['update', 'B', 2, 1]])
+        assert written == [['update', 'B', 2, 1]]
+        assert demo_api.numbers == {'A': 5, 'B': 2}
+
+
+class TestProgress(unittest.TestCase):
+    """Test Class for the progress of the changes"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        self.progress_file = os.path.join(self.directory.name, 'api_demo.progress')
+
+    def tearDown(self):
+        self.directory.cleanup()
+
+    def interrupted(self, done: list, planned: list, updated: float = None, owner: list = None) -> None:
+        """Write the progress of a clear, by default of a process that is not running anymore."""
+        with open(self.progress_file, 'w', encoding='utf-8') as file:
+            json.dump({'endpoints': {'http://api/': {
+                'arguments': ['clear', None, None], 'owner': owner or [os.getpid(), -1], 'processed': len(done), 'remaining': 1, 'rate': 1.0,
+                'done': done, 'planned': planned, 'finished': False,
+                'updated': time.time() if updated is None else updated}}}, file)
+
+    def progress(self) -> api_demo.Progress:
+        """Progress of a clear."""
+        return api_demo.Progress(self.progress_file, 'http://api/', ['clear', None, None])
+
+    def test_write(self) -> None:
+        """The progress is written after every change."""
+        progress = self.progress()
+        progress.start(['A', 'B'])
+        progress.step('A')
+        with open(self.progress_file, encoding='utf-8') as file:
+            written = json.load(file)['endpoints']['http://api/']
+        assert written['processed'] == 1 and written['remaining'] == 1 and not written['finished']
+        assert sorted(os.listdir(self.directory.name)) == ['api_demo.progress', 'api_demo.progress.lock']
+
+    def test_resume(self) -> None:
+        """An interrupted clear is continued with the characters that are left."""
+        self.interrupted(['A', 'B'], ['A', 'B', 'C'])
+        assert self.progress().resume(['C']) == ['A', 'B']
+
+    def test_resume_changed(self) -> None:
+        """An interrupted clear is not continued if other characters are set since."""
+        self.interrupted(['A', 'B'], ['A', 'B'])
+        assert not self.progress().resume(['C', 'D', 'E'])
+
+    def test_resume_expired(self) -> None:
+        """An old interrupted clear is not continued."""
+        self.interrupted(['A'], ['A', 'B'], time.time() - api_demo.PROGRESS_MAX_AGE - 1)
+        assert not self.progress().resume(['B'])
+
+    def test_resume_running(self) -> None:
+        """A clear of a process that is still running is not continued."""
+        self.interrupted(['A'], ['A', 'B'], owner=[os.getpid(), api_demo.process_start(os.getpid())])
+        assert not self.progress().resume(['B'])
+
+    def test_invalid_file(self) -> None:
+        """A progress file that is not valid is ignored."""
+        for content in ['not json', '{"endpoints": []}', '{"endpoints": {"http://api/": {"done": 1}}}']:
+            with open(self.progress_file, 'w', encoding='utf-8') as file:
+                file.write(content)
+            assert not self.progress().resume(['A'])
+
+    def test_write_parallel(self) -> None:
+        """The progress of endpoints that are written at the same time are all kept."""
+        def write(index: int) -> None:
+            progress = api_demo.Progress(self.progress_file, f'http://api{index}/', ['clear', None, None])
+            progress.start(['A'])
+            progress.step('A')
+            progress.write(finished=True)
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            list(executor.map(write, range(16)))
+        with open(self.progress_file, encoding='utf-8') as file:
+            assert len(json.load(file)['endpoints']) == 16
+
+
+class TestCompactDiffs(unittest.TestCase):
+    """Test Class for the compact diff"""
+
+    def test_compact_diffs(self) -> None:
+        """At most max_keys changes are returned, all of them are in the diff_file."""
+        changes = [['reset', character, None, None] for character in 'ABCDE']
+        results = {'http://api/': {'changed': True, 'diff': {'changes': list(changes)}}}
+        with tempfile.TemporaryDirectory() as directory:
+            diff_file = os.path.join(directory, 'api_demo.diff')
+            api_demo.compact_diffs(results, 2, diff_file)
+            with open(diff_file, encoding='utf-8') as file:
+                assert json.load(file) == {'endpoints': {'http://api/': changes}}
+        diff = results['http://api/']['diff']
+        assert diff['changes'] == changes[:2] and diff['omitted'] == 3 and diff['file'] == diff_file
+        assert diff['prepared'] == f'http://api/\nreset A\nreset B\n... 3 more changes in {diff_file}\n'
+
+    def test_render_change(self) -> None:
+        """The changes are shown as text with --diff."""
+        assert api_demo.render_change(['update', 'A', 3, 9]) == 'update A: 3 -> 9'
+        assert api_demo.render_change(['set', 'A', None, 9]) == 'set A: 9'
+        assert api_demo.render_change(['reset', 'A', None, None]) == 'reset A'
+
+
+class TestMergeResults(unittest.TestCase):
+    """Test Class for the result of multiple endpoints"""
+
+    def test_merge(self) -> None:
+        """The module is changed if one endpoint is changed, the diffs get the endpoint as header."""
+        diff = {'before': {'character': 'A', 'number': 1}, 'after': {'character': 'A', 'number': 2}}
+        result = {'changed': False, 'rc': 1, 'diff': None}
+        api_demo.merge_results(result, {'http://api1/': {'changed': False, 'diff': None},
+                                        'http://api2/': {'changed': True, 'diff': diff}}, False)
+        assert result['changed']
+        assert result['diff'] == [dict(diff, before_header='http://api2/', after_header='http://api2/')]
+        assert result['endpoint_results']['http://api2/']['diff'] == diff
+
+    def test_merge_compact(self) -> None:
+        """A compact diff is not returned twice."""
+        result = {'changed': False, 'rc': 1, 'diff': None}
+        api_demo.merge_results(result, {'http://api1/': {'changed': True, 'diff': {'changes': [
+            ['reset', 'A', None, None]]}}}, True)
+        assert result['diff'][0]['changes'] == [['reset', 'A', None, None]]
+        assert 'diff' not in result['endpoint_results']['http://api1/']
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -1,7 +1,15 @@
 """Test module for DemoApi."""
 
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import os
+import tempfile
+import threading
+import time
 import unittest
-from demoapi import DemoApi
+from unittest import mock
+import requests
+import demoapi
+from demoapi import Change, DemoApi, PinnedAdapter, ValidationError, check_batch, diff_snapshots, validate_batch
 
 
 class TestApi(unittest.TestCase):
@@ -44,6 +52,210 @@ class TestApi(unittest.TestCase):
         check = self.demo_api.get('A')
         assert check == 5
 
+    def test_warm_up(self) -> None:
+        """Test module with a warm up of the connection."""
+        self.demo_api = DemoApi(None, None, 'secret', 'http://localhost:5041/', warm_up=True)
+        adapter = self.demo_api.session.get_adapter(self.demo_api.uri)
+        assert isinstance(adapter, PinnedAdapter)
+        assert 'localhost:5041' in demoapi.load_dns_cache()
+        # the warm up does not connect, the first call opens the connection
+        settings = self.demo_api.session.merge_environment_settings(self.demo_api.uri, {}, None, None, None)
+        pool = adapter.get_connection_with_tls_context(
+            requests.Request('GET', self.demo_api.uri).prepare(), settings['verify'], settings['proxies'])
+        assert pool.num_connections == 0
+        self.demo_api.set('A', 5)
+        check = self.demo_api.get('A')
+        assert check == 5
+        assert pool.num_connections == 1
+
+    def test_compare_and_set(self) -> None:
+        """Test set with an expected number that is not correct (anymore)."""
+        self.demo_api.set('A', 5)
+        # A is set, but expected not to be
+        assert self.demo_api.compare_and_set('A', None, 7)
+        assert self.demo_api.get('A') == 7
+        assert not self.demo_api.compare_and_set('A', 7, 7)
+        # B is not set, but expected to be
+        assert self.demo_api.compare_and_set('B', 3, 4)
+        assert self.demo_api.get('B') == 4
+        # invalid input is not retried as a conflict
+        with self.assertRaises(ValidationError):
+            self.demo_api.compare_and_set('a', None, 5)
+        with self.assertRaises(ValidationError):
+            self.demo_api.compare_and_set('A', None, 999)
+
+    def test_watch(self) -> None:
+        """Test the watch of the characters."""
+        self.demo_api.set('A', 5)
+        changes = self.demo_api.watch(interval=0.01)
+        assert next(changes) == Change('added', 'A', None, 5)
+        self.demo_api.update('A', 6)
+        assert next(changes) == Change('changed', 'A', 5, 6)
+        self.demo_api.reset('A')
+        assert next(changes) == Change('removed', 'A', 6, None)
+
+
+class TestValidate(unittest.TestCase):
+    """Test Class for the validation (without the API)"""
+
+    def test_validate_batch(self) -> None:
+        """All violations are returned at once."""
+        assert not validate_batch(['A', 'Z'], [1, 255])
+        violations = validate_batch(['A', 'a', 'AB', None], [0, 5, 256, True])
+        assert len(violations) == 6
+        assert 'character: "a" must be an alpha letter and in upper case' in violations
+
+    def test_check_batch(self) -> None:
+        """A bad batch raises with all the violations."""
+        items = {'A': 5, 'b': 300}
+        check_batch(['A'], [5])
+        with self.assertRaises(ValidationError) as context:
+            check_batch(items.keys(), items.values())
+        assert len(context.exception.violations) == 2
+
+    def test_diff_snapshots(self) -> None:
+        """Only the added, changed and removed characters are returned."""
+        changes = diff_snapshots({'A': 1, 'B': 2, 'C': 3}, {'A': 1, 'B': 4, 'D': 5})
+        assert changes == [Change('added', 'D', None, 5),
+                           Change('changed', 'B', 2, 4),
+                           Change('removed', 'C', 3, None)]
+
+
+class FlakyDemoApi(DemoApi):
+    """DemoApi with the numbers in memory, that fails the next calls as given"""
+
+    def __init__(self, numbers: dict):
+        super().__init__(None, None, 'secret', 'http://api/')
+        self.numbers = numbers
+        self.get_errors = []  # a status code (or None) for the next get calls
+        self.down = 0  # the number of next list calls that can not connect
+
+    def get(self, character: str) -> int:
+        status_code = self.get_errors.pop(0) if self.get_errors else None
+        if status_code:
+            response = requests.Response()
+            response.status_code = status_code
+            raise requests.HTTPError(f'{status_code} Error', response=response)
+        return self.numbers[character]
+
+    def list(self) -> list:
+        if self.down:
+            self.down -= 1
+            raise requests.ConnectionError('Connection refused')
+        return list(self.numbers)
+
+
+class TestWatch(unittest.TestCase):
+    """Test Class for the watch when the API fails (without the API)"""
+
+    def setUp(self):
+        patch = mock.patch.object(demoapi.time, 'sleep')
+        self.sleep = patch.start()
+        self.addCleanup(patch.stop)
+
+    def test_snapshot_error(self) -> None:
+        """A character that can not be read is not reported as removed."""
+        demo_api = FlakyDemoApi({'A': 1, 'B': 2})
+        demo_api.get_errors = [500]
+        assert demo_api.snapshot({'A': 3}) == {'A': 3, 'B': 2}
+        changes = demo_api.watch()
+        assert next(changes) == Change('added', 'A', None, 1)
+        assert next(changes) == Change('added', 'B', None, 2)
+        demo_api.get_errors = [500]
+        demo_api.numbers['B'] = 4
+        assert next(changes) == Change('changed', 'B', 2, 4)
+        del demo_api.numbers['A']
+        assert next(changes) == Change('removed', 'A', 1, None)
+        demo_api.get_errors = [401]
+        with self.assertRaises(requests.HTTPError):
+            next(changes)
+
+    def test_connection_error(self) -> None:
+        """The last snapshot is kept and the time between polls doubles while the API is down."""
+        demo_api = FlakyDemoApi({'A': 1})
+        changes = demo_api.watch(interval=1.0, max_interval=4.0)
+        assert next(changes) == Change('added', 'A', None, 1)
+        demo_api.down = 3
+        demo_api.numbers['A'] = 2
+        assert next(changes) == Change('changed', 'A', 1, 2)
+        waits = [call.args[0] for call in self.sleep.call_args_list]
+        assert waits == [1.0, 2.0, 4.0, 4.0]
+
+
+class TestWarmUp(unittest.TestCase):
+    """Test Class for the address cache and the pinned connections (without the API)"""
+
+    def setUp(self):
+        self.directory = tempfile.TemporaryDirectory()  # pylint: disable=consider-using-with
+        cache_directory = os.path.join(self.directory.name, 'demoapi')
+        self.cache_file = os.path.join(cache_directory, 'dns-cache.json')
+        self.patches = [mock.patch.object(demoapi, 'DNS_CACHE_DIRECTORY', cache_directory),
+                        mock.patch.object(demoapi, 'DNS_CACHE_FILE', self.cache_file)]
+        for patch in self.patches:
+            patch.start()
+
+    def tearDown(self):
+        for patch in self.patches:
+            patch.stop()
+        self.directory.cleanup()
+
+    def test_cache(self) -> None:
+        """The cache is only readable by the user and only trusted if nobody else can change it."""
+        addresses = demoapi.resolve('localhost', 80)
+        assert oct(os.stat(self.cache_file).st_mode & 0o777) == '0o600'
+        cache = demoapi.load_dns_cache()
+        cache['localhost:80']['addresses'] = ['192.0.2.1']
+        demoapi.save_dns_cache(cache)
+        assert demoapi.resolve('localhost', 80) == ['192.0.2.1']
+        os.chmod(self.cache_file, 0o666)
+        assert demoapi.resolve('localhost', 80) == addresses
+
+    def test_pinned_adapter(self) -> None:
+        """The address is used for the connection, the host name for SNI and the Host header."""
+        adapter = PinnedAdapter(['192.0.2.1'])
+        request = requests.Request('GET', 'https://example.com:8443/character').prepare()
+        host_params, pool_kwargs = adapter.build_connection_pool_key_attributes(request, True)
+        assert host_params['host'] == '192.0.2.1'
+        assert pool_kwargs['server_hostname'] == 'example.com'
+        adapter.add_headers(request)
+        assert request.headers['Host'] == 'example.com:8443'
+        # without an address left, the host name is resolved as usual
+        host_params, pool_kwargs = PinnedAdapter([]).build_connection_pool_key_attributes(request, True)
+        assert host_params['host'] == 'example.com'
+        assert 'server_hostname' not in pool_kwargs
+
+    def test_next_address(self) -> None:
+        """An address that refuses the connection is skipped, without an extra request."""
+        methods = []
+
+        class Handler(BaseHTTPRequestHandler):
+            """Only the list of characters"""
+
+            def do_GET(self):  # pylint: disable=invalid-name
+                """The list of characters is empty"""
+                methods.append(self.command)
+                self.send_response(200)
+                self.send_header('Content-Length', '2')
+                self.end_headers()
+                self.wfile.write(b'[]')
+
+            def log_message(self, *args):  # pylint: disable=arguments-differ
+                pass
+
+        server = ThreadingHTTPServer(('127.0.0.1', 0), Handler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        port = server.server_address[1]
+        demoapi.save_dns_cache({f'localhost:{port}': {'addresses': ['127.0.0.2', '127.0.0.1'],
+                                                      'expires': time.time() + 60}})
+        demo_api = DemoApi(None, None, 'secret', f'http://localhost:{port}/', warm_up=True)
+        assert not methods
+        assert demo_api.list() == []
+        assert demo_api.list() == []
+        assert methods == ['GET', 'GET']
+        assert demo_api.session.get_adapter(demo_api.uri).addresses == ['127.0.0.1']
+
 
 if __name__ == '__main_':
     unittest.main()